@@ -1,12 +1,14 @@
+import asyncio
+import hashlib
 import json
 import os
 import sys
 import time
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
-import requests
-from openai import OpenAI
+import orjson
 from jsonl_logger import get_logger
+from mcp_rpc import McpClient
 from dotenv import load_dotenv
 
 MCP_SERVER_URL = "http://127.0.0.1:5000/rpc"
@@ -28,49 +30,37 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 # Anthropic settings
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-20241022")
+ANTHROPIC_MAX_TOKENS = int(os.getenv("ANTHROPIC_MAX_TOKENS", "1024"))
 
+# Log full LLM responses instead of a compact projection
+LOG_VERBOSE = os.getenv("LOG_VERBOSE", "0") == "1"
 
-def mcp_initialize() -> Dict[str, Any]:
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "initialize",
-        "params": {
-            "protocolVersion": "2025-06-18",
-            "capabilities": {},
-            "clientInfo": {"name": "ToolChatDemo", "version": "0.1"},
-        },
-    }
-    logger.log("client_request", {"method": "initialize", "payload": payload})
-    resp = requests.post(MCP_SERVER_URL, json=payload).json()
-    logger.log("client_response", {"method": "initialize", "response": resp})
-    return resp
-
-
-def mcp_list_tools() -> List[Dict[str, Any]]:
-    payload = {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": None}
-    logger.log("client_request", {"method": "tools/list", "payload": payload})
-    resp = requests.post(MCP_SERVER_URL, json=payload).json()
-    logger.log("client_response", {"method": "tools/list", "response": resp})
-    return resp.get("result", {}).get("tools", [])
-
-
-def mcp_call_tool(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-    payload = {
-        "jsonrpc": "2.0",
-        "id": int(time.time()),
-        "method": "tools/call",
-        "params": {"name": name, "arguments": arguments},
-    }
-    logger.log("client_request", {"method": "tools/call", "payload": payload})
-    resp = requests.post(MCP_SERVER_URL, json=payload).json()
-    logger.log("client_response", {"method": "tools/call", "response": resp})
-    if "result" in resp:
-        return resp["result"]
-    raise RuntimeError(resp.get("error", {"message": "Unknown MCP error"}))
+# Print full tool schemas at startup instead of just the tool names
+SHOW_TOOLS = os.getenv("SHOW_TOOLS", "0") == "1"
+
+# Tools whose results depend only on their arguments and the files they read;
+# repeated calls are answered from a local cache until a write touches the file.
+READ_ONLY_TOOLS = {t.strip() for t in os.getenv("MCP_READ_ONLY_TOOLS", "read_file,search_file,list_files").split(",") if t.strip()}
+
+mcp = McpClient(MCP_SERVER_URL, logger, "ToolChatDemo", read_only_tools=READ_ONLY_TOOLS)
+
+
+# Formatted tool lists keyed by (target format, digest of the MCP tool list).
+# Tool definitions rarely change within a session, so repeat calls reuse them.
+_FORMATTED_TOOLS: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+
+
+def tools_digest(tools: List[Dict[str, Any]]) -> str:
+    return hashlib.blake2b(json.dumps(tools, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
 
 
 def format_tools_for_openai(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    key = ("openai", tools_digest(tools))
+    cached = _FORMATTED_TOOLS.get(key)
+    if cached is not None:
+        logger.log("tools_mapped_for_llm", {"count": len(cached), "provider": PROVIDER, "cached": True})
+        return cached
+
     formatted = []
     for t in tools:
         name = t.get("name")
@@ -86,12 +76,19 @@ def format_tools_for_openai(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]
                 },
             }
         )
+    _FORMATTED_TOOLS[key] = formatted
     logger.log("tools_mapped_for_llm", {"count": len(formatted), "provider": PROVIDER})
     return formatted
 
 
 def format_tools_for_anthropic(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # Anthropic expects: [{ name, description, input_schema }]
+    key = ("anthropic", tools_digest(tools))
+    cached = _FORMATTED_TOOLS.get(key)
+    if cached is not None:
+        logger.log("tools_mapped_for_llm", {"count": len(cached), "provider": "anthropic", "cached": True})
+        return cached
+
     formatted = []
     for t in tools:
         formatted.append(
@@ -101,12 +98,219 @@ def format_tools_for_anthropic(tools: List[Dict[str, Any]]) -> List[Dict[str, An
                 "input_schema": t.get("inputSchema", {"type": "object", "properties": {}}),
             }
         )
+    _FORMATTED_TOOLS[key] = formatted
     logger.log("tools_mapped_for_llm", {"count": len(formatted), "provider": "anthropic"})
     return formatted
 
 
-def run_chat_openai_like(base_url: str, api_key: str, model_name: str, tools: List[Dict[str, Any]]) -> None:
-    client = OpenAI(base_url=base_url, api_key=api_key)
+def tool_result_content(name: str, outcome: Any) -> str:
+    if isinstance(outcome, Exception):
+        logger.log("llm_tool_error", {"name": name, "error": str(outcome)}, level="ERROR")
+        return json.dumps({"isError": True, "message": str(outcome)})
+    return json.dumps(outcome)
+
+
+async def run_openai_tool_calls(tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # All tool calls from one turn go to the MCP server in a single batch
+    calls: List[Tuple[str, Dict[str, Any]]] = []
+    for tc in tool_calls:
+        fn_name = tc["function"]["name"]
+        try:
+            args = json.loads(tc["function"]["arguments"] or "{}")
+        except json.JSONDecodeError:
+            args = {}
+        logger.log("llm_tool_call", {"name": fn_name, "arguments": args, "tool_call_id": tc["id"]})
+        calls.append((fn_name, args))
+
+    outcomes = await mcp.call_tools_batch(calls)
+    return [
+        {
+            "tool_call_id": tc["id"],
+            "role": "tool",
+            "name": fn_name,
+            "content": tool_result_content(fn_name, outcome),
+        }
+        for tc, (fn_name, _), outcome in zip(tool_calls, calls, outcomes)
+    ]
+
+
+async def run_anthropic_tool_uses(blocks: List[Any]) -> List[Dict[str, Any]]:
+    calls: List[Tuple[str, Dict[str, Any]]] = []
+    for block in blocks:
+        args = block.input if hasattr(block, "input") else {}
+        logger.log("llm_tool_call", {"name": block.name, "arguments": args, "tool_call_id": block.id})
+        calls.append((block.name, args))
+
+    outcomes = await mcp.call_tools_batch(calls)
+    return [
+        {
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": tool_result_content(block.name, outcome),
+        }
+        for block, outcome in zip(blocks, outcomes)
+    ]
+
+
+def print_loaded_tools(tools: List[Dict[str, Any]]) -> None:
+    if SHOW_TOOLS:
+        print("Loaded tools:")
+        print(orjson.dumps(tools, option=orjson.OPT_INDENT_2).decode())
+    else:
+        print("Loaded tools:", ", ".join(t.get("name", "?") for t in tools))
+
+
+async def prewarm_llm(client: Any) -> None:
+    # Open the LLM connection (TCP/TLS) before the first question so the first
+    # turn is dominated by model time rather than handshakes. Best effort only.
+    start = time.perf_counter()
+    try:
+        await client.models.list()
+    except Exception as e:
+        logger.log("llm_prewarm_failed", {"error": str(e)}, level="WARNING")
+        return
+    logger.log("llm_prewarm", {"elapsed_ms": round((time.perf_counter() - start) * 1000, 1)})
+
+
+async def stream_openai_completion(client: Any, **kwargs: Any) -> Dict[str, Any]:
+    # Prints content deltas as they arrive and returns the assembled assistant
+    # message; tool call fragments are stitched together by their index.
+    stream = await client.chat.completions.create(stream=True, **kwargs)
+    resp_id = None
+    model = None
+    usage = None
+    finish_reason = None
+    content_parts: List[str] = []
+    tool_calls: Dict[int, Dict[str, Any]] = {}
+    async for chunk in stream:
+        resp_id = resp_id or chunk.id
+        model = model or chunk.model
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage.model_dump()
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        delta = choice.delta
+        if delta.content:
+            print(delta.content, end="", flush=True)
+            content_parts.append(delta.content)
+        for tc in delta.tool_calls or []:
+            # Some servers omit the index and send each call whole
+            idx = tc.index if tc.index is not None else len(tool_calls)
+            slot = tool_calls.setdefault(idx, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+            if tc.id:
+                slot["id"] = tc.id
+            if tc.function is not None:
+                slot["function"]["name"] += tc.function.name or ""
+                slot["function"]["arguments"] += tc.function.arguments or ""
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+    if content_parts:
+        print()
+    return {
+        "id": resp_id,
+        "model": model,
+        "usage": usage,
+        "finish_reason": finish_reason,
+        "content": "".join(content_parts) or None,
+        "tool_calls": [tool_calls[i] for i in sorted(tool_calls)],
+    }
+
+
+async def stream_anthropic_message(client: Any, **kwargs: Any) -> Any:
+    # Prints text as it streams; the SDK accumulates tool_use input deltas into
+    # the final message, which is returned for tool dispatch.
+    printed = False
+    async with client.messages.stream(**kwargs) as stream:
+        async for text in stream.text_stream:
+            print(text, end="", flush=True)
+            printed = True
+        message = await stream.get_final_message()
+    if printed:
+        print()
+    return message
+
+
+def project_openai_response(message: Dict[str, Any]) -> Dict[str, Any]:
+    # Compact log view of an assembled completion; the full text only with LOG_VERBOSE=1
+    record = {
+        "id": message["id"],
+        "model": message["model"],
+        "usage": message["usage"],
+        "finish_reason": message["finish_reason"],
+        "has_tool_calls": bool(message["tool_calls"]),
+        "content_preview": (message["content"] or "")[:200],
+    }
+    if LOG_VERBOSE:
+        record["raw"] = message
+    return record
+
+
+def project_anthropic_response(resp: Any) -> Dict[str, Any]:
+    # One pass over the blocks; only text blocks are touched for their .text
+    texts = []
+    has_tool_use = False
+    for p in resp.content:
+        if p.type == "text":
+            texts.append(p.text)
+        elif p.type == "tool_use":
+            has_tool_use = True
+    text = "".join(texts)
+    record = {
+        "id": resp.id,
+        "model": resp.model,
+        "usage": resp.usage.model_dump() if resp.usage else None,
+        "stop_reason": resp.stop_reason,
+        "has_tool_use": has_tool_use,
+        "content_preview": text[:200],
+    }
+    if LOG_VERBOSE:
+        record["raw"] = resp.model_dump()
+    return record
+
+
+async def openai_turn(client: Any, model_name: str, system_prompt: str,
+                      available_tools: List[Dict[str, Any]], user_msg: str) -> None:
+    messages: List[Dict[str, Any]] = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_msg},
+    ]
+
+    logger.log("chat_request", {"messages": messages, "provider": PROVIDER})
+    message = await stream_openai_completion(
+        client,
+        model=model_name,
+        messages=messages,
+        tools=available_tools,
+        tool_choice="auto",
+    )
+    logger.log("chat_response", project_openai_response(message))
+
+    if message["tool_calls"]:
+        tool_results = await run_openai_tool_calls(message["tool_calls"])
+
+        # Echo the model's own tool_calls (ids and real arguments) then the results
+        messages.append({"role": "assistant", "content": message["content"], "tool_calls": message["tool_calls"]})
+        messages.extend(tool_results)
+
+        logger.log("chat_followup_request", {"messages": messages})
+        final = await stream_openai_completion(
+            client,
+            model=model_name,
+            messages=messages,
+        )
+        logger.log("chat_followup_response", project_openai_response(final))
+
+
+def run_chat_openai_like(runner: asyncio.Runner, base_url: str, api_key: str, model_name: str, tools: List[Dict[str, Any]]) -> None:
+    # Imported here so PROVIDER=anthropic runs never load the openai package
+    try:
+        from openai import AsyncOpenAI
+    except Exception as e:
+        raise RuntimeError("OpenAI SDK not installed or import failed") from e
+
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key)
+    runner.run(prewarm_llm(client))
 
     system_prompt = (
         "You are a helpful assistant with access to tools. "
@@ -116,99 +320,69 @@ def run_chat_openai_like(base_url: str, api_key: str, model_name: str, tools: Li
 
     available_tools = format_tools_for_openai(tools)
 
-    print("Loaded tools:")
-    print(json.dumps(tools, indent=2))
+    print_loaded_tools(tools)
 
     print("\nType your question (Ctrl+C to exit):")
-    while True:
-        try:
-            user_msg = input("> ")
-        except KeyboardInterrupt:
-            print("\nBye!")
-            break
-
-        messages: List[Dict[str, Any]] = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_msg},
-        ]
-
-        logger.log("chat_request", {"messages": messages, "provider": PROVIDER})
-        resp = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            tools=available_tools,
-            tool_choice="auto",
+    try:
+        while True:
+            try:
+                user_msg = input("> ")
+            except KeyboardInterrupt:
+                print("\nBye!")
+                break
+
+            runner.run(openai_turn(client, model_name, system_prompt, available_tools, user_msg))
+    finally:
+        runner.run(client.close())
+
+
+async def anthropic_turn(client: Any, system_prompt: str, anthropic_tools: List[Dict[str, Any]], user_msg: str) -> None:
+    messages = [
+        {"role": "user", "content": user_msg},
+    ]
+
+    logger.log("chat_request", {"messages": messages, "provider": PROVIDER})
+    resp = await stream_anthropic_message(
+        client,
+        model=ANTHROPIC_MODEL,
+        max_tokens=ANTHROPIC_MAX_TOKENS,
+        system=system_prompt,
+        tools=anthropic_tools,
+        messages=messages,
+    )
+    logger.log("chat_response", project_anthropic_response(resp))
+
+    # Collect tool uses
+    tool_use_blocks = [b for b in resp.content if b.type == "tool_use"]
+    tool_results_blocks = await run_anthropic_tool_uses(tool_use_blocks) if tool_use_blocks else []
+
+    if tool_results_blocks:
+        follow_resp = await stream_anthropic_message(
+            client,
+            model=ANTHROPIC_MODEL,
+            max_tokens=ANTHROPIC_MAX_TOKENS,
+            system=system_prompt,
+            tools=anthropic_tools,
+            messages=[
+                {"role": "user", "content": user_msg},
+                {"role": "assistant", "content": resp.content},
+                {"role": "user", "content": tool_results_blocks},
+            ],
         )
-        logger.log("chat_response", {"raw": resp.model_dump()})
-
-        choice = resp.choices[0]
-        message = choice.message
-
-        if message.tool_calls:
-            tool_results: List[Dict[str, Any]] = []
-            for tc in message.tool_calls:
-                fn_name = tc.function.name
-                try:
-                    args = json.loads(tc.function.arguments or "{}")
-                except json.JSONDecodeError:
-                    args = {}
-                logger.log("llm_tool_call", {"name": fn_name, "arguments": args, "tool_call_id": tc.id})
-                try:
-                    mcp_result = mcp_call_tool(fn_name, args)
-                    tool_results.append(
-                        {
-                            "tool_call_id": tc.id,
-                            "role": "tool",
-                            "name": fn_name,
-                            "content": json.dumps(mcp_result),
-                        }
-                    )
-                except Exception as e:
-                    tool_results.append(
-                        {
-                            "tool_call_id": tc.id,
-                            "role": "tool",
-                            "name": fn_name,
-                            "content": json.dumps({"isError": True, "message": str(e)}),
-                        }
-                    )
-                    logger.log("llm_tool_error", {"name": fn_name, "error": str(e)}, level="ERROR")
-
-            followup_messages = messages + [
-                {
-                    "role": "assistant",
-                    "tool_calls": [
-                        {
-                            "id": tr["tool_call_id"],
-                            "type": "function",
-                            "function": {"name": tr["name"], "arguments": "{}"},
-                        }
-                        for tr in tool_results
-                    ],
-                }
-            ] + tool_results
-
-            logger.log("chat_followup_request", {"messages": followup_messages})
-            final = client.chat.completions.create(
-                model=model_name,
-                messages=followup_messages,
-            )
-            logger.log("chat_followup_response", {"raw": final.model_dump()})
-            print(final.choices[0].message.content or "")
-        else:
-            print(message.content or "")
-
-
-def run_chat_anthropic(tools: List[Dict[str, Any]]) -> None:
+        logger.log("chat_followup_response", project_anthropic_response(follow_resp))
+
+
+def run_chat_anthropic(runner: asyncio.Runner, tools: List[Dict[str, Any]]) -> None:
     try:
-        from anthropic import Anthropic
+        from anthropic import AsyncAnthropic
     except Exception as e:
         raise RuntimeError("Anthropic SDK not installed or import failed") from e
 
     if not ANTHROPIC_API_KEY:
         raise RuntimeError("ANTHROPIC_API_KEY not set in environment")
 
-    client = Anthropic(api_key=ANTHROPIC_API_KEY)
+    client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    runner.run(prewarm_llm(client))
 
     system_prompt = (
         "You are a helpful assistant with access to tools. "
@@ -218,100 +392,43 @@ def run_chat_anthropic(tools: List[Dict[str, Any]]) -> None:
 
     anthropic_tools = format_tools_for_anthropic(tools)
 
-    print("Loaded tools:")
-    print(json.dumps(tools, indent=2))
+    print_loaded_tools(tools)
 
     print("\nType your question (Ctrl+C to exit):")
-    while True:
-        try:
-            user_msg = input("> ")
-        except KeyboardInterrupt:
-            print("\nBye!")
-            break
-
-        messages = [
-            {"role": "user", "content": user_msg},
-        ]
+    try:
+        while True:
+            try:
+                user_msg = input("> ")
+            except KeyboardInterrupt:
+                print("\nBye!")
+                break
 
-        logger.log("chat_request", {"messages": messages, "provider": PROVIDER})
-        resp = client.messages.create(
-            model=ANTHROPIC_MODEL,
-            system=system_prompt,
-            tools=anthropic_tools,
-            messages=messages,
-        )
-        logger.log("chat_response", {"raw": resp.model_dump() if hasattr(resp, 'model_dump') else str(resp)})
-
-        # Collect tool uses
-        tool_results_blocks: List[Dict[str, Any]] = []
-        tool_use_ids: List[str] = []
-        for block in resp.content:
-            if getattr(block, "type", None) == "tool_use":
-                fn_name = block.name
-                tool_use_id = block.id
-                tool_use_ids.append(tool_use_id)
-                args = block.input if hasattr(block, "input") else {}
-                logger.log("llm_tool_call", {"name": fn_name, "arguments": args, "tool_call_id": tool_use_id})
-                try:
-                    mcp_result = mcp_call_tool(fn_name, args)
-                    tool_results_blocks.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": json.dumps(mcp_result),
-                        }
-                    )
-                except Exception as e:
-                    tool_results_blocks.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": json.dumps({"isError": True, "message": str(e)}),
-                        }
-                    )
-                    logger.log("llm_tool_error", {"name": fn_name, "error": str(e)}, level="ERROR")
-
-        if tool_results_blocks:
-            follow_resp = client.messages.create(
-                model=ANTHROPIC_MODEL,
-                system=system_prompt,
-                tools=anthropic_tools,
-                messages=[
-                    {"role": "user", "content": user_msg},
-                    {"role": "assistant", "content": resp.content},
-                    {"role": "user", "content": tool_results_blocks},
-                ],
-            )
-            logger.log("chat_followup_response", {"raw": follow_resp.model_dump() if hasattr(follow_resp, 'model_dump') else str(follow_resp)})
-            # Print concatenated text parts
-            final_text = "".join(
-                getattr(p, "text", "") if getattr(p, "type", "") == "text" else ""
-                for p in follow_resp.content
-            )
-            print(final_text)
-        else:
-            # No tool use; print text from first response
-            text_out = "".join(
-                getattr(p, "text", "") if getattr(p, "type", "") == "text" else ""
-                for p in resp.content
-            )
-            print(text_out)
+            runner.run(anthropic_turn(client, system_prompt, anthropic_tools, user_msg))
+    finally:
+        runner.run(client.close())
 
 
 def run_chat():
-    init_info = mcp_initialize()
-    tools = mcp_list_tools()
-
-    if PROVIDER == "openai":
-        base_url = OPENAI_BASE_URL if OPENAI_BASE_URL else None
-        if not OPENAI_API_KEY:
-            raise RuntimeError("OPENAI_API_KEY not set in environment")
-        run_chat_openai_like(base_url or "https://api.openai.com/v1", OPENAI_API_KEY, OPENAI_MODEL, tools)
-    elif PROVIDER == "anthropic":
-        run_chat_anthropic(tools)
-    else:
-        # default to ollama
-        run_chat_openai_like(OLLAMA_BASE_URL, os.getenv("OLLAMA_API_KEY", "ollama"), OLLAMA_MODEL, tools)
+    # A single event loop for the whole session keeps the pooled MCP
+    # connections alive between turns while the input loop stays synchronous.
+    with asyncio.Runner() as runner:
+        try:
+            # These also open the pooled MCP connection reused by every later turn
+            init_info = runner.run(mcp.initialize())
+            tools = runner.run(mcp.list_tools())
+
+            if PROVIDER == "openai":
+                base_url = OPENAI_BASE_URL if OPENAI_BASE_URL else None
+                if not OPENAI_API_KEY:
+                    raise RuntimeError("OPENAI_API_KEY not set in environment")
+                run_chat_openai_like(runner, base_url or "https://api.openai.com/v1", OPENAI_API_KEY, OPENAI_MODEL, tools)
+            elif PROVIDER == "anthropic":
+                run_chat_anthropic(runner, tools)
+            else:
+                # default to ollama
+                run_chat_openai_like(runner, OLLAMA_BASE_URL, os.getenv("OLLAMA_API_KEY", "ollama"), OLLAMA_MODEL, tools)
+        finally:
+            runner.run(mcp.aclose())
 
 
 if __name__ == "__main__":
@@ -1,73 +1,77 @@
-import requests
+import asyncio
 import json
 from jsonl_logger import get_logger
+from mcp_rpc import McpClient
 
 logger = get_logger("mcp-client-simple")
 
 MCP_SERVER_URL = "http://127.0.0.1:5000/rpc"
 
-init_payload = {
-    "jsonrpc": "2.0",
-    "id": 1,
-    "method": "initialize",
-    "params": {
-        "protocolVersion": "2025-06-18",
-        "capabilities": {},
-        "clientInfo": {"name": "ExampleClient", "version": "0.1"}
-    }
-}
-logger.log("client_request", {"method": "initialize", "payload": init_payload})
-print(">> Sending initialize")
-response = requests.post(MCP_SERVER_URL, json=init_payload).json()
-logger.log("client_response", {"method": "initialize", "response": response})
-print("<< Received init response:", json.dumps(response, indent=2), "\n")
 
-# List tools
-tools_list_payload = {
-    "jsonrpc": "2.0",
-    "id": 2,
-    "method": "tools/list",
-    "params": None
-}
-logger.log("client_request", {"method": "tools/list", "payload": tools_list_payload})
-print(">> Requesting tools list")
-response = requests.post(MCP_SERVER_URL, json=tools_list_payload).json()
-logger.log("client_response", {"method": "tools/list", "response": response})
-tools = response.get("result", {}).get("tools", [])
-print("<< Available tools:", json.dumps(tools, indent=2), "\n")
-
-# Demonstrate calls
-tool_names = {t['name'] for t in tools}
-if "write_file" in tool_names and "search_file" in tool_names:
-    write_payload = {
-        "jsonrpc": "2.0",
-        "id": 3,
-        "method": "tools/call",
-        "params": {
-            "name": "write_file",
-            "arguments": {"filename": "demo.txt", "text": "Hello\nThis is a TODO line.\nBye"}
+async def main():
+    # Same pooled transport as chat_with_tools.py; the payloads stay explicit here
+    mcp = McpClient(MCP_SERVER_URL, logger, "ExampleClient")
+    try:
+        init_payload = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-06-18",
+                "capabilities": {},
+                "clientInfo": {"name": "ExampleClient", "version": "0.1"}
+            }
         }
-    }
-    logger.log("client_request", {"method": "tools/call", "payload": write_payload})
-    print(">> Calling write_file to create 'demo.txt'")
-    response = requests.post(MCP_SERVER_URL, json=write_payload).json()
-    logger.log("client_response", {"method": "tools/call", "response": response})
-    print("<< write_file result:", json.dumps(response, indent=2), "\n")
-
-    search_payload = {
-        "jsonrpc": "2.0",
-        "id": 4,
-        "method": "tools/call",
-        "params": {
-            "name": "search_file",
-            "arguments": {"filename": "demo.txt", "keyword": "TODO"}
+        tools_list_payload = {
+            "jsonrpc": "2.0",
+            "id": 2,
+            "method": "tools/list",
+            "params": None
         }
-    }
-    logger.log("client_request", {"method": "tools/call", "payload": search_payload})
-    print(">> Calling search_file to find 'TODO' in 'demo.txt'")
-    response = requests.post(MCP_SERVER_URL, json=search_payload).json()
-    logger.log("client_response", {"method": "tools/call", "response": response})
-    print("<< search_file result:", json.dumps(response, indent=2), "\n")
-else:
-    logger.log("client_warning", {"message": "Required tools not available"}, level="WARNING")
-    print("Required tools not available.")
+        # initialize and tools/list do not depend on each other: send them as one
+        # JSON-RPC batch (a single POST) and match the replies by id
+        logger.log("client_request", {"method": "batch", "payload": [init_payload, tools_list_payload]})
+        print(">> Sending initialize + tools/list as one batch")
+        responses = {r.get("id"): r for r in await mcp.send([init_payload, tools_list_payload])}
+        logger.log("client_response", {"method": "batch", "response": list(responses.values())})
+        print("<< Received init response:", json.dumps(responses.get(1), indent=2), "\n")
+        tools = responses.get(2, {}).get("result", {}).get("tools", [])
+        print("<< Available tools:", json.dumps(tools, indent=2), "\n")
+
+        # Demonstrate calls
+        tool_names = {t['name'] for t in tools}
+        if "write_file" in tool_names and "search_file" in tool_names:
+            write_payload = {
+                "jsonrpc": "2.0",
+                "id": 3,
+                "method": "tools/call",
+                "params": {
+                    "name": "write_file",
+                    "arguments": {"filename": "demo.txt", "text": "Hello\nThis is a TODO line.\nBye"}
+                }
+            }
+            search_payload = {
+                "jsonrpc": "2.0",
+                "id": 4,
+                "method": "tools/call",
+                "params": {
+                    "name": "search_file",
+                    "arguments": {"filename": "demo.txt", "keyword": "TODO"}
+                }
+            }
+            # The server runs batch entries in order, so search_file sees the new file
+            logger.log("client_request", {"method": "batch", "payload": [write_payload, search_payload]})
+            print(">> Calling write_file to create 'demo.txt' and search_file to find 'TODO' in one batch")
+            responses = {r.get("id"): r for r in await mcp.send([write_payload, search_payload])}
+            logger.log("client_response", {"method": "batch", "response": list(responses.values())})
+            print("<< write_file result:", json.dumps(responses.get(3), indent=2), "\n")
+            print("<< search_file result:", json.dumps(responses.get(4), indent=2), "\n")
+        else:
+            logger.log("client_warning", {"message": "Required tools not available"}, level="WARNING")
+            print("Required tools not available.")
+    finally:
+        await mcp.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
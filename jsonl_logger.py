@@ -1,25 +1,66 @@
+import atexit
+import functools
 import json
 import os
+import queue
 import socket
 import threading
 import time
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Set
+
+import orjson
+
+_STOP = object()
+# Most lines joined into one write by the writer thread
+_WRITE_BATCH = 256
+
+# Log directories already created by this process
+_ENSURED_DIRS: Set[str] = set()
 
 
 class JsonlLogger:
-    def __init__(self, file_path: str, component: str) -> None:
+    def __init__(self, file_path: str, component: str, max_pending: int = 10_000) -> None:
         self.file_path = file_path
         self.component = component
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        # High-water mark for queued lines: past it, log() drops records (counted
+        # and reported by the writer) instead of growing memory without bound.
+        self.max_pending = max_pending
+        self._dropped = 0
+        log_dir = os.path.dirname(self.file_path)
+        if log_dir not in _ENSURED_DIRS:
+            os.makedirs(log_dir, exist_ok=True)
+            _ENSURED_DIRS.add(log_dir)
         self._lock = threading.Lock()
+        self._closed = False
         self._hostname = socket.gethostname()
         self._pid = os.getpid()
+        # (epoch second, "YYYY-MM-DDTHH:MM:SS") so only the fraction is formatted per event
+        self._ts_cache = (-1, "")
+        # Opened once and unbuffered binary; only the writer thread touches it.
+        self._fh = open(self.file_path, "ab", buffering=0)
+        # log() serializes on the caller's thread (so the record is a snapshot of
+        # its data) and hands the bytes to a daemon writer; file I/O never runs
+        # on the caller's thread.
+        self._q: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._drain, name=f"jsonl-logger-{component}", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     def _now_iso(self) -> str:
-        return datetime.now(timezone.utc).isoformat()
+        sec, ns = divmod(time.time_ns(), 1_000_000_000)
+        cached = self._ts_cache
+        if cached[0] != sec:
+            cached = (sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec)))
+            self._ts_cache = cached
+        return f"{cached[1]}.{ns // 1000:06d}+00:00"
 
     def log(self, event: str, data: Optional[Dict[str, Any]] = None, level: str = "INFO", **extra: Any) -> None:
+        if self._closed:
+            return
+        if self._q.qsize() >= self.max_pending:
+            with self._lock:
+                self._dropped += 1
+            return
         record = {
             "ts": self._now_iso(),
             "level": level,
@@ -30,13 +71,57 @@ class JsonlLogger:
             "host": self._hostname,
             **extra,
         }
-        line = json.dumps(record, ensure_ascii=False)
+        try:
+            line = orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson rejects some values the stdlib encoder takes (integers past
+            # 64 bits); anything neither can encode is logged as a placeholder
+            # record so logging never raises into the caller.
+            try:
+                line = (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode()
+            except (TypeError, ValueError) as e:
+                record["data"] = {"log_encode_error": str(e)}
+                line = orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE, default=str)
+        self._q.put(line)
+
+    def _drain(self) -> None:
+        while True:
+            lines = [self._q.get()]
+            # Coalesce whatever else is already queued into a single write
+            while len(lines) < _WRITE_BATCH:
+                try:
+                    lines.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(line is _STOP for line in lines)
+            chunk = b"".join(line for line in lines if line is not _STOP)
+            if self._dropped:
+                with self._lock:
+                    dropped, self._dropped = self._dropped, 0
+                chunk += orjson.dumps({
+                    "ts": self._now_iso(),
+                    "level": "WARNING",
+                    "component": self.component,
+                    "event": "log_dropped",
+                    "data": {"count": dropped},
+                    "pid": self._pid,
+                    "host": self._hostname,
+                }, option=orjson.OPT_APPEND_NEWLINE)
+            self._fh.write(chunk)
+            if stop:
+                self._fh.close()
+                return
+
+    def close(self) -> None:
         with self._lock:
-            with open(self.file_path, "a", encoding="utf-8") as f:
-                f.write(line + "\n")
-                f.flush()
+            if self._closed:
+                return
+            self._closed = True
+        self._q.put(_STOP)
+        self._writer.join(timeout=5)
 
 
+@functools.lru_cache(maxsize=None)
 def get_logger(component: str, log_dir: str = "./logs", filename: Optional[str] = None) -> JsonlLogger:
     if filename is None:
         safe_name = component.replace("/", "-")
@@ -0,0 +1,231 @@
+import asyncio
+import itertools
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import orjson
+
+from jsonl_logger import JsonlLogger
+
+# Shared MCP JSON-RPC client used by client.py and chat_with_tools.py
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# tools/call bodies are spliced from constant prefixes around the
+# orjson-encoded variable parts instead of building an envelope dict per call.
+_CALL_PREFIX = b'{"jsonrpc":"2.0","method":"tools/call","id":'
+_CALL_NAME = b',"params":{"name":'
+_CALL_ARGS = b',"arguments":'
+
+
+def _dumps(value: Any) -> bytes:
+    # orjson refuses integers past 64 bits, which json.loads happily produces
+    # from model output; those values go through the stdlib encoder instead.
+    try:
+        return orjson.dumps(value)
+    except TypeError:
+        return json.dumps(value).encode()
+
+
+def tool_call_body(rpc_id: int, name: str, arguments: Dict[str, Any]) -> bytes:
+    return _CALL_PREFIX + str(rpc_id).encode() + _CALL_NAME + _dumps(name) + _CALL_ARGS + _dumps(arguments) + b"}}"
+
+
+def tool_call_result(resp: Dict[str, Any]) -> Dict[str, Any]:
+    if "result" in resp:
+        return resp["result"]
+    raise RuntimeError(resp.get("error", {"message": "Unknown MCP error"}))
+
+
+class ToolResultCache:
+    def __init__(self, logger: JsonlLogger, read_only_tools: Iterable[str] = (), maxsize: int = 256) -> None:
+        self.logger = logger
+        # Tools whose results depend only on their arguments and the files they
+        # read; anything else is treated as a write.
+        self.read_only_tools = set(read_only_tools)
+        self.maxsize = maxsize
+        # Bumped on every invalidation; a result is only stored if no write was
+        # observed between sending its request and receiving the answer.
+        self.generation = 0
+        self._entries: "OrderedDict[str, Tuple[Optional[str], Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def _key(name: str, arguments: Dict[str, Any]) -> str:
+        return name + "|" + json.dumps(arguments, sort_keys=True)
+
+    def get(self, name: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Arguments that are not an object (the model's JSON can be anything)
+        # are never cached; the call goes to the server, which reports the error
+        if name not in self.read_only_tools or not isinstance(arguments, dict):
+            return None
+        key = self._key(name, arguments)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        self.logger.log("tool_cache_hit", {"name": name, "arguments": arguments})
+        return entry[1]
+
+    def put(self, name: str, arguments: Dict[str, Any], result: Dict[str, Any], generation: int) -> None:
+        if name not in self.read_only_tools or generation != self.generation or not isinstance(arguments, dict):
+            return
+        self._entries[self._key(name, arguments)] = (arguments.get("filename"), result)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, name: str, arguments: Dict[str, Any]) -> None:
+        # Any non-read-only call may change files: drop cached results for the
+        # same filename plus listings; without a filename, drop everything.
+        if name in self.read_only_tools:
+            return
+        self.generation += 1
+        filename = arguments.get("filename") if isinstance(arguments, dict) else None
+        if filename is None:
+            self._entries.clear()
+            return
+        for key in [k for k, (f, _) in self._entries.items() if f is None or f == filename]:
+            del self._entries[key]
+
+
+class McpClient:
+    def __init__(self, url: str, logger: JsonlLogger, client_name: str, client_version: str = "0.1",
+                 read_only_tools: Iterable[str] = ()) -> None:
+        self.url = url
+        self.logger = logger
+        # One pooled async client for every round trip: connections stay alive
+        # between calls and independent requests can be in flight at once. On
+        # https:// endpoints HTTP/2 is negotiated, multiplexing them over one
+        # connection; plain http:// stays on HTTP/1.1 keep-alive.
+        self._http = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(max_keepalive_connections=16, max_connections=100, keepalive_expiry=60),
+            ),
+            timeout=httpx.Timeout(60.0, connect=3.0),
+        )
+        self.cache = ToolResultCache(logger, read_only_tools)
+        # JSON-RPC ids for tools/call; unique per client so batched responses
+        # map back to their requests (ids 1 and 2 are initialize and tools/list).
+        self._rpc_id = itertools.count(100)
+        # The static initialize and tools/list bodies are serialized once
+        self.initialize_payload = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-06-18",
+                "capabilities": {},
+                "clientInfo": {"name": client_name, "version": client_version},
+            },
+        }
+        self._initialize_body = orjson.dumps(self.initialize_payload)
+        self.tools_list_payload = {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": None}
+        self._tools_list_body = orjson.dumps(self.tools_list_payload)
+
+    async def post(self, body: bytes) -> httpx.Response:
+        return await self._http.post(self.url, content=body, headers=_JSON_HEADERS)
+
+    async def send(self, payload: Any) -> Any:
+        # Raw JSON-RPC exchange: a request object or a batch array in, the decoded reply out
+        return orjson.loads((await self.post(orjson.dumps(payload))).content)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def initialize(self) -> Dict[str, Any]:
+        self.logger.log("client_request", {"method": "initialize", "payload": self.initialize_payload})
+        resp = orjson.loads((await self.post(self._initialize_body)).content)
+        self.logger.log("client_response", {"method": "initialize", "response": resp})
+        return resp
+
+    async def list_tools(self) -> List[Dict[str, Any]]:
+        self.logger.log("client_request", {"method": "tools/list", "payload": self.tools_list_payload})
+        resp = orjson.loads((await self.post(self._tools_list_body)).content)
+        self.logger.log("client_response", {"method": "tools/list", "response": resp})
+        return resp.get("result", {}).get("tools", [])
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        cached = self.cache.get(name, arguments)
+        if cached is not None:
+            return cached
+        self.cache.invalidate(name, arguments)
+        generation = self.cache.generation
+
+        rpc_id = next(self._rpc_id)
+        self.logger.log("client_request", {"method": "tools/call", "id": rpc_id, "name": name, "arguments": arguments})
+        resp = orjson.loads((await self.post(tool_call_body(rpc_id, name, arguments))).content)
+        self.logger.log("client_response", {"method": "tools/call", "response": resp})
+        result = tool_call_result(resp)
+        self.cache.invalidate(name, arguments)
+        self.cache.put(name, arguments, result, generation)
+        return result
+
+    async def call_tools_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        # One JSON-RPC batch POST for several tools/call requests. Returns one entry
+        # per call, in order: the tool result or the exception raised for it (like
+        # asyncio.gather(..., return_exceptions=True)). Falls back to concurrent
+        # single calls if the server does not accept batches.
+        outcomes: List[Any] = [None] * len(calls)
+        generation = self.cache.generation
+        pending: List[int] = []
+        for i, (n, a) in enumerate(calls):
+            try:
+                cached = self.cache.get(n, a)
+                if cached is None:
+                    self.cache.invalidate(n, a)
+            except Exception as e:
+                outcomes[i] = e
+                continue
+            if cached is not None:
+                outcomes[i] = cached
+                continue
+            pending.append(i)
+        if not pending:
+            return outcomes
+
+        rpc_ids = {i: next(self._rpc_id) for i in pending}
+        bodies = []
+        for i in list(pending):
+            try:
+                bodies.append(tool_call_body(rpc_ids[i], *calls[i]))
+            except Exception as e:
+                outcomes[i] = e
+                pending.remove(i)
+        if not pending:
+            return outcomes
+        self.logger.log("client_request", {"method": "tools/call", "batch": True, "calls": [
+            {"id": rpc_ids[i], "name": calls[i][0], "arguments": calls[i][1]} for i in pending
+        ]})
+        body = b"[" + b",".join(bodies) + b"]"
+        try:
+            http_resp = await self.post(body)
+        except httpx.HTTPError as e:
+            # Connection failures and timeouts become per-call outcomes, like
+            # any other tool error, instead of ending the caller's turn
+            self.logger.log("client_transport_error", {"method": "tools/call", "batch": True, "error": str(e)},
+                            level="ERROR")
+            for i in pending:
+                outcomes[i] = e
+            return outcomes
+        try:
+            resp = orjson.loads(http_resp.content) if http_resp.status_code == 200 else None
+        except ValueError:
+            resp = None
+        if not isinstance(resp, list):
+            self.logger.log("client_batch_rejected", {"status": http_resp.status_code}, level="WARNING")
+            results = await asyncio.gather(*(self.call_tool(*calls[i]) for i in pending), return_exceptions=True)
+            for i, outcome in zip(pending, results):
+                outcomes[i] = outcome
+            return outcomes
+        self.logger.log("client_response", {"method": "tools/call", "batch": True, "response": resp})
+
+        by_id = {r.get("id"): r for r in resp if isinstance(r, dict)}
+        for i in pending:
+            try:
+                outcomes[i] = tool_call_result(by_id.get(rpc_ids[i], {}))
+                self.cache.put(calls[i][0], calls[i][1], outcomes[i], generation)
+            except Exception as e:
+                outcomes[i] = e
+        return outcomes
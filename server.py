@@ -1,10 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, send_file
+import functools
 import os
+import re
+import stat
+from urllib.parse import quote
+import orjson
 from jsonl_logger import get_logger
 
 app = Flask(__name__)
 BASE_DIR = "./mcp_files"
 os.makedirs(BASE_DIR, exist_ok=True)
+# Tool file operations resolve names relative to this directory descriptor
+# (one openat/unlinkat per call, no path joining); None where dir_fd is not
+# supported, e.g. on Windows
+BASE_FD = (os.open(BASE_DIR, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+           if os.open in os.supports_dir_fd else None)
 
 logger = get_logger("mcp-server")
 
@@ -17,13 +27,16 @@ TOOLS = {
         }, "required": ["files"]}
     },
     "read_file": {
-        "description": "Read the contents of a file",
+        "description": "Read the contents of a file (files of 1 MiB or more return a download path instead)",
         "inputSchema": {"type": "object", "properties": {
             "filename": {"type": "string"}
         }, "required": ["filename"]},
         "outputSchema": {"type": "object", "properties": {
-            "content": {"type": "string"}
-        }, "required": ["content"]}
+            "content": {"type": "string"},
+            "content_stream": {"type": "boolean"},
+            "size": {"type": "integer"},
+            "blob": {"type": "string"}
+        }, "required": []}
     },
     "write_file": {
         "description": "Write text to a file (creates or overwrites)",
@@ -56,42 +69,168 @@ TOOLS = {
     }
 }
 
+INITIALIZE_RESULT = {
+    "protocolVersion": "2025-06-18",
+    "capabilities": {
+        "tools": {"listChanged": False},
+        "resources": {"subscribe": False, "listChanged": False},
+        "prompts": {"listChanged": False}
+    },
+    "serverInfo": {"name": "FileServer", "version": "1.0"}
+}
+
+# The public tools/list projection of TOOLS, built once at import
+TOOLS_LIST = tuple(
+    {
+        "name": name,
+        "description": meta["description"],
+        "inputSchema": meta["inputSchema"],
+        "outputSchema": meta["outputSchema"]
+    }
+    for name, meta in TOOLS.items()
+)
+
+# initialize and tools/list answers never change: serialize them once and splice
+# the bytes into each reply envelope
+_INITIALIZE_RESULT = orjson.dumps(INITIALIZE_RESULT)
+_TOOLS_LIST_RESULT = orjson.dumps({"tools": TOOLS_LIST})
+
+def result_envelope(jsonrpc, req_id, result: bytes) -> bytes:
+    return b'{"jsonrpc":' + orjson.dumps(jsonrpc) + b',"id":' + orjson.dumps(req_id) + b',"result":' + result + b"}"
+
+# tools/call replies carry the result in structuredContent; the text content is
+# a short "<tool> ok" unless the caller sets params.textPreview, and then it is
+# capped at this many characters
+TEXT_PREVIEW_LIMIT = 1024
+
+def text_preview(result_data) -> str:
+    # Long string fields are cut before formatting, so a large read_file result
+    # is never stringified in full
+    clipped = {k: v[:TEXT_PREVIEW_LIMIT] if isinstance(v, str) else v for k, v in result_data.items()}
+    text = str(clipped)
+    return text if len(text) <= TEXT_PREVIEW_LIMIT else text[:TEXT_PREVIEW_LIMIT] + "..."
+
+def _open(filename: str, flags: int) -> int:
+    if BASE_FD is None:
+        return os.open(os.path.join(BASE_DIR, filename), flags, 0o644)
+    return os.open(filename, flags, 0o644, dir_fd=BASE_FD)
+
+def _open_regular(filename: str) -> int:
+    # Opens for reading and checks the type on the open descriptor, so the
+    # file checked is the file read. O_NONBLOCK keeps the open itself from
+    # blocking on a FIFO; it is cleared once the file is known to be regular.
+    try:
+        fd = _open(filename, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0))
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f"{filename} not found")
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        raise FileNotFoundError(f"{filename} not found")
+    os.set_blocking(fd, True)
+    return fd
+
 def list_files():
-    files = os.listdir(BASE_DIR)
+    files = os.listdir(BASE_DIR if BASE_FD is None else BASE_FD)
     return {"files": files}
 
+# read_file inlines files below this size; larger ones are streamed from
+# GET /rpc/blob/<filename> in BLOB_CHUNK_SIZE pieces instead of being held
+# (bytes, str and JSON-escaped copies) in memory
+READ_INLINE_LIMIT = 1 << 20
+BLOB_CHUNK_SIZE = 64 * 1024
+
 def read_file(filename: str):
-    filepath = os.path.join(BASE_DIR, filename)
-    if not os.path.isfile(filepath):
-        raise FileNotFoundError(f"{filename} not found")
-    with open(filepath, 'r') as f:
+    with open(_open_regular(filename), 'r') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= READ_INLINE_LIMIT:
+            return {"content_stream": True, "size": size, "blob": "/rpc/blob/" + quote(filename)}
         content = f.read()
     return {"content": content}
 
 def write_file(filename: str, text: str):
-    filepath = os.path.join(BASE_DIR, filename)
-    with open(filepath, 'w') as f:
+    with open(_open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC), 'w') as f:
         f.write(text)
     return {"message": f"Wrote {len(text)} bytes to {filename}"}
 
 def delete_file(filename: str):
-    filepath = os.path.join(BASE_DIR, filename)
-    if os.path.isfile(filepath):
-        os.remove(filepath)
+    try:
+        if BASE_FD is None:
+            os.unlink(os.path.join(BASE_DIR, filename))
+        else:
+            os.unlink(filename, dir_fd=BASE_FD)
         deleted = True
-    else:
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
         deleted = False
     return {"deleted": deleted}
 
-def search_file(filename: str, keyword: str):
-    filepath = os.path.join(BASE_DIR, filename)
-    if not os.path.isfile(filepath):
-        raise FileNotFoundError(f"{filename} not found")
+SEARCH_BLOCK_SIZE = 1 << 20
+
+@functools.lru_cache(maxsize=128)
+def _line_pattern(kw: bytes) -> re.Pattern:
+    # Each match runs from kw to the end of its line, so there is one match per
+    # line containing kw
+    return re.compile(re.escape(kw) + rb"[^\n]*")
+
+def _count_lines_with(data: bytes, kw: bytes, start: int, end: int) -> int:
+    # Lines in data[start:end] (whole lines) containing kw
+    if kw and not kw.endswith(b"\n"):
+        return sum(1 for _ in _line_pattern(kw).finditer(data, start, end))
+    # Empty or newline-terminated keywords: jump from each match to the next line
     count = 0
-    with open(filepath, 'r') as f:
-        for line in f:
-            if keyword in line:
+    pos = data.find(kw, start, end)
+    while pos != -1 and pos < end:
+        count += 1
+        nl = data.find(b"\n", pos, end)
+        if nl == -1:
+            break
+        pos = data.find(kw, nl + 1, end)
+    return count
+
+def search_file(filename: str, keyword: str):
+    with open(_open_regular(filename), 'rb') as f:
+        kw = keyword.encode()
+        # Lines are matched as text mode reads them: \r\n and a bare \r end a
+        # line as \n, so \r never matches and a newline can only be the last byte
+        if b"\r" in kw or b"\n" in kw[:-1]:
+            return {"count": 0}
+        keep = len(kw) - 1
+        count = 0
+        # State of the line still open at the end of a block: whether it was
+        # already counted, and its last len(kw) - 1 bytes for matches spanning
+        # two blocks. Nothing else is carried, however long the line is.
+        matched = False
+        tail = b""
+        cr = b""
+        while True:
+            block = f.read(SEARCH_BLOCK_SIZE)
+            if not block:
+                break
+            data = cr + block
+            cr = b""
+            if data.endswith(b"\r"):
+                # May be the first half of \r\n; settled with the next block
+                data, cr = data[:-1], b"\r"
+            if b"\r" in data:
+                data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            buf = tail + data
+            first = buf.find(b"\n")
+            if first == -1:
+                if not matched and kw in buf:
+                    count += 1
+                    matched = True
+                tail = buf[-keep:] if keep > 0 else b""
+                continue
+            if not matched and kw in buf[:first + 1]:
                 count += 1
+            last = buf.rfind(b"\n")
+            count += _count_lines_with(buf, kw, first + 1, last + 1)
+            rest = buf[last + 1:]
+            matched = bool(rest) and kw in rest
+            count += matched
+            tail = rest[-keep:] if keep > 0 else b""
+        if cr and not matched and kw in tail + b"\n":
+            # A trailing bare \r ends the last line
+            count += 1
     return {"count": count}
 
 TOOL_FUNCTIONS = {
@@ -102,39 +241,106 @@ TOOL_FUNCTIONS = {
     "search_file": lambda params: search_file(params.get("filename"), params.get("keyword"))
 }
 
+def encode_reply(reply) -> bytes:
+    # handle_rpc returns either an envelope dict or an already encoded envelope
+    return reply if isinstance(reply, bytes) else orjson.dumps(reply)
+
+def json_response(payload):
+    return app.response_class(encode_reply(payload), mimetype="application/json")
+
 @app.route("/rpc", methods=["POST"])
 def rpc():
-    req = request.get_json(force=True)
+    try:
+        # Parsed straight from the body bytes; cache=False so Werkzeug does not
+        # keep its own copy around for the rest of the request
+        req = orjson.loads(request.get_data(cache=False))
+    except orjson.JSONDecodeError:
+        req = None
     if req is None:
         logger.log("rpc_parse_error", {"remote": request.remote_addr})
-        return jsonify({"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse error"}})
+        return json_response({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}})
+    if isinstance(req, list):
+        # JSON-RPC batch: one HTTP round trip, one response array
+        if not req:
+            return json_response({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}})
+        logger.log("rpc_batch", {"size": len(req)}, remote=request.remote_addr)
+        return json_response(b"[" + b",".join(encode_reply(handle_rpc(r)) for r in req) + b"]")
+    if is_raw_read(req):
+        return raw_read_file(req)
+    return json_response(handle_rpc(req))
+
+def is_raw_read(req) -> bool:
+    if not isinstance(req, dict) or req.get("method") != "tools/call":
+        return False
+    params = req.get("params")
+    return isinstance(params, dict) and params.get("name") == "read_file" and bool(params.get("raw"))
+
+def raw_read_file(req):
+    # read_file with params.raw (single requests only): the file itself is the
+    # HTTP body, handed to the WSGI file wrapper (sendfile where supported)
+    # instead of being decoded and re-encoded inside a JSON envelope.
+    req_id = req.get("id")
+    args = req["params"].get("arguments") or {}
+    filename = args.get("filename")
+    logger.log("tool_call_request", {"name": "read_file", "arguments": args, "id": req_id, "raw": True},
+               remote=request.remote_addr)
+    try:
+        if not isinstance(filename, str):
+            raise FileNotFoundError(f"{filename} not found")
+        f = open(_open_regular(filename), 'rb')
+    except FileNotFoundError as e:
+        error_msg = str(e)
+        logger.log("tool_call_error", {"name": "read_file", "error": error_msg, "id": req_id}, level="ERROR")
+        return json_response({"jsonrpc": req.get("jsonrpc", "2.0"), "id": req_id,
+                              "error": {"code": 1, "message": error_msg}})
+    st = os.fstat(f.fileno())
+    logger.log("tool_call_success", {"name": "read_file", "id": req_id, "raw": True, "size": st.st_size})
+    # Served from the descriptor that passed the type check; without a path
+    # Flask cannot see the size, so Content-Length is set here. /rpc is
+    # POST-only, so there are no conditional or range requests to answer.
+    rv = send_file(f, mimetype="application/octet-stream", conditional=False)
+    rv.content_length = st.st_size
+    return rv
+
+@app.route("/rpc/blob/<path:filename>")
+def rpc_blob(filename):
+    # Only what read_file would have pointed at: a plain name in BASE_DIR that
+    # is too large to inline
+    try:
+        if os.path.basename(filename) != filename or filename in ("", ".", "..") or \
+                (os.altsep and os.altsep in filename):
+            raise FileNotFoundError(f"{filename} not found")
+        f = open(_open_regular(filename), 'rb')
+    except FileNotFoundError as e:
+        logger.log("blob_not_found", {"filename": filename}, level="ERROR")
+        return json_response({"error": {"code": 1, "message": str(e)}}), 404
+    size = os.fstat(f.fileno()).st_size
+    if size < READ_INLINE_LIMIT:
+        f.close()
+        logger.log("blob_not_found", {"filename": filename, "size": size}, level="ERROR")
+        return json_response({"error": {"code": 1, "message": f"{filename} not found"}}), 404
+    logger.log("blob_stream", {"filename": filename, "size": size}, remote=request.remote_addr)
+
+    def chunks():
+        with f:
+            yield from iter(lambda: f.read(BLOB_CHUNK_SIZE), b"")
+
+    return app.response_class(chunks(), mimetype="application/octet-stream",
+                              headers={"Content-Length": str(size)})
+
+def handle_rpc(req):
+    if not isinstance(req, dict):
+        return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}}
     jsonrpc = req.get("jsonrpc", "2.0")
     method = req.get("method")
     req_id = req.get("id")
     logger.log("rpc_request", {"method": method, "id": req_id, "payload": req}, remote=request.remote_addr)
     if method == "initialize":
-        response = {
-            "protocolVersion": "2025-06-18",
-            "capabilities": {
-                "tools": {"listChanged": False},
-                "resources": {"subscribe": False, "listChanged": False},
-                "prompts": {"listChanged": False}
-            },
-            "serverInfo": {"name": "FileServer", "version": "1.0"}
-        }
-        logger.log("rpc_response", {"method": method, "id": req_id, "result": response})
-        return jsonify({"jsonrpc": jsonrpc, "id": req_id, "result": response})
+        logger.log("rpc_response", {"method": method, "id": req_id, "result": INITIALIZE_RESULT})
+        return result_envelope(jsonrpc, req_id, _INITIALIZE_RESULT)
     if method == "tools/list":
-        tools_list = []
-        for name, meta in TOOLS.items():
-            tools_list.append({
-                "name": name,
-                "description": meta["description"],
-                "inputSchema": meta["inputSchema"],
-                "outputSchema": meta["outputSchema"]
-            })
-        logger.log("rpc_response", {"method": method, "id": req_id, "count": len(tools_list)})
-        return jsonify({"jsonrpc": jsonrpc, "id": req_id, "result": {"tools": tools_list}})
+        logger.log("rpc_response", {"method": method, "id": req_id, "count": len(TOOLS_LIST)})
+        return result_envelope(jsonrpc, req_id, _TOOLS_LIST_RESULT)
     if method == "tools/call":
         params = req.get("params", {})
         tool_name = params.get("name")
@@ -143,26 +349,27 @@ def rpc():
         if tool_name in TOOL_FUNCTIONS:
             try:
                 result_data = TOOL_FUNCTIONS[tool_name](args)
-                content_item = {"type": "text", "text": str(result_data)}
+                text = text_preview(result_data) if params.get("textPreview") else f"{tool_name} ok"
+                content_item = {"type": "text", "text": text}
                 response = {
                     "content": [content_item],
                     "structuredContent": result_data,
                     "isError": False
                 }
                 logger.log("tool_call_success", {"name": tool_name, "result": result_data, "id": req_id})
-                return jsonify({"jsonrpc": jsonrpc, "id": req_id, "result": response})
+                return {"jsonrpc": jsonrpc, "id": req_id, "result": response}
             except Exception as e:
                 error_msg = str(e)
                 logger.log("tool_call_error", {"name": tool_name, "error": error_msg, "id": req_id}, level="ERROR")
-                return jsonify({"jsonrpc": jsonrpc, "id": req_id,
-                                "error": {"code": 1, "message": error_msg}})
+                return {"jsonrpc": jsonrpc, "id": req_id,
+                        "error": {"code": 1, "message": error_msg}}
         else:
             logger.log("tool_not_found", {"name": tool_name, "id": req_id}, level="ERROR")
-            return jsonify({"jsonrpc": jsonrpc, "id": req_id,
-                            "error": {"code": 404, "message": f"Tool '{tool_name}' not found"}})
+            return {"jsonrpc": jsonrpc, "id": req_id,
+                    "error": {"code": 404, "message": f"Tool '{tool_name}' not found"}}
     logger.log("rpc_method_not_found", {"method": method, "id": req_id}, level="ERROR")
-    return jsonify({"jsonrpc": jsonrpc, "id": req_id,
-                    "error": {"code": -32601, "message": "Method not found"}})
+    return {"jsonrpc": jsonrpc, "id": req_id,
+            "error": {"code": -32601, "message": "Method not found"}}
 
 @app.route("/events")
 def events():